@@ -5,17 +5,25 @@ Routes requests and adds authentication, rate limiting, and observability
 
 import os
 import time
+import hashlib
 import httpx
 import asyncio
+import orjson
+from dataclasses import dataclass
 from typing import Dict, Any
+from cachetools import TTLCache
 from fastapi import FastAPI, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from starlette.datastructures import URL
 from opentelemetry import trace
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
 from opentelemetry.sdk.resources import Resource
@@ -31,15 +39,23 @@ trace.set_tracer_provider(TracerProvider(resource=resource))
 tracer_provider = trace.get_tracer_provider()
 
 otlp_exporter = OTLPSpanExporter(
-    endpoint=os.getenv("PHOENIX_ENDPOINT", "http://phoenix:6006/v1/traces")
+    endpoint=os.getenv("PHOENIX_ENDPOINT", "phoenix:4317"),
+    insecure=True
 )
 
-span_processor = BatchSpanProcessor(otlp_exporter)
+# Larger, less frequent batches amortize export cost across many spans
+span_processor = BatchSpanProcessor(
+    otlp_exporter,
+    max_queue_size=8192,
+    max_export_batch_size=1024,
+    schedule_delay_millis=2000,
+    export_timeout_millis=15000
+)
 tracer_provider.add_span_processor(span_processor)
 
 tracer = trace.get_tracer(__name__)
 
-app = FastAPI(title="API Gateway", version="1.0.0")
+app = FastAPI(title="API Gateway", version="1.0.0", default_response_class=ORJSONResponse)
 
 # Enable CORS
 app.add_middleware(
@@ -54,53 +70,98 @@ app.add_middleware(
 FastAPIInstrumentor.instrument_app(app)
 HTTPXClientInstrumentor().instrument()
 
-# Services configuration
-SERVICES = {
-    "llm-service": os.getenv("LLM_SERVICE_URL", "http://llm-service:8000"),
-    "vector-store": os.getenv("VECTOR_STORE_URL", "http://vector-store:8001")
-}
+# Services configuration (fully-formed URLs, built once at import)
+@dataclass(frozen=True)
+class ServiceURLs:
+    llm_ask: str
+    llm_health: str
+    llm_metrics: str
+    vector_health: str
+    vector_stats: str
+
+    @classmethod
+    def from_env(cls) -> "ServiceURLs":
+        llm_service = os.getenv("LLM_SERVICE_URL", "http://llm-service:8000")
+        vector_store = os.getenv("VECTOR_STORE_URL", "http://vector-store:8001")
+        return cls(
+            llm_ask=f"{llm_service}/ask",
+            llm_health=f"{llm_service}/health",
+            llm_metrics=f"{llm_service}/metrics",
+            vector_health=f"{vector_store}/health",
+            vector_stats=f"{vector_store}/stats"
+        )
+
+URLS = ServiceURLs.from_env()
+
+# Downstream health probes: (service name, health URL)
+HEALTH_CHECKS = (
+    ("llm-service", URLS.llm_health),
+    ("vector-store", URLS.vector_health)
+)
 
 # HTTP client for service communication
-http_client = httpx.AsyncClient(timeout=30.0)
+http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=256, max_keepalive_connections=128, keepalive_expiry=60),
+    timeout=httpx.Timeout(30.0, connect=5.0)
+)
 
 # Simple auth
 security = HTTPBearer(auto_error=False)
 
-# Rate limiting storage (in-memory for demo)
-request_counts: Dict[str, Dict[str, int]] = {}
+# Verified users keyed by token hash
+auth_cache: TTLCache = TTLCache(maxsize=10_000, ttl=30)
+
+# Rate limiting storage, shared by all workers and replicas
+redis_client = Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379"))
+TOTAL_REQUESTS_KEY = "rl:total"
 
 class QuestionRequest(BaseModel):
     question: str
     context_limit: int = 5
     temperature: float = 0.7
 
-async def get_client_ip(request: Request) -> str:
-    """Get client IP address"""
-    forwarded = request.headers.get("X-Forwarded-For")
-    if forwarded:
-        return forwarded.split(",")[0].strip()
-    return request.client.host if request.client else "unknown"
+def get_client_ip(request: Request) -> str:
+    """Get client IP address (cached on request.state)"""
+    client_ip = getattr(request.state, "client_ip", None)
+    if client_ip is not None:
+        return client_ip
+    for key, value in request.scope["headers"]:
+        if key == b"x-forwarded-for":
+            forwarded = value.split(b",", 1)[0].strip()
+            if forwarded:
+                client_ip = forwarded.decode("latin-1")
+                break
+    else:
+        client = request.scope.get("client")
+        client_ip = client[0] if client else "unknown"
+    request.state.client_ip = client_ip
+    return client_ip
 
 async def check_rate_limit(client_ip: str, limit: int = 100) -> bool:
-    """Simple rate limiting check"""
-    current_time = int(time.time() / 60)  # Per minute
-    
-    if client_ip not in request_counts:
-        request_counts[client_ip] = {}
-    
-    if current_time not in request_counts[client_ip]:
-        request_counts[client_ip][current_time] = 0
-    
-    request_counts[client_ip][current_time] += 1
-    
-    # Clean old entries
-    cutoff = current_time - 5  # Keep last 5 minutes
-    for ip in request_counts:
-        for timestamp in list(request_counts[ip].keys()):
-            if timestamp < cutoff:
-                del request_counts[ip][timestamp]
-    
-    return request_counts[client_ip][current_time] <= limit
+    """Rate limiting check (fixed one-minute window per IP, shared via Redis)"""
+    window = int(time.time()) // 60
+    key = f"rl:{client_ip}:{window}"
+    clients_key = f"rl:clients:{window}"
+    try:
+        # Same round trip also maintains the running totals read by /api/v1/stats
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.incr(key)
+            pipe.expire(key, 120)
+            pipe.incr(TOTAL_REQUESTS_KEY)
+            pipe.pfadd(clients_key, client_ip)
+            pipe.expire(clients_key, 120)
+            count, *_ = await pipe.execute()
+    except RedisError:
+        # Fail open so a Redis outage does not take the gateway down
+        return True
+    return count <= limit
+
+@app.on_event("shutdown")
+async def close_clients():
+    """Close the shared HTTP and Redis clients"""
+    await http_client.aclose()
+    await redis_client.aclose()
 
 async def authenticate(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
     """Simple authentication check"""
@@ -108,109 +169,160 @@ async def authenticate(credentials: HTTPAuthorizationCredentials = Depends(secur
         # For demo, allow unauthenticated requests
         return {"user_id": "anonymous", "role": "user"}
     
-    # In real implementation, validate JWT token
+    # Cache verified users by token hash; raw tokens are never stored
     token = credentials.credentials
+    token_hash = hashlib.sha256(token.encode()).digest()
+    user = auth_cache.get(token_hash)
+    if user is not None:
+        return user
+    
+    # In real implementation, validate JWT token
     if token == "demo-token":
-        return {"user_id": "demo-user", "role": "admin"}
+        user = {"user_id": "demo-user", "role": "admin"}
     elif token.startswith("user-"):
-        return {"user_id": token, "role": "user"}
+        user = {"user_id": token, "role": "user"}
     else:
         raise HTTPException(status_code=401, detail="Invalid authentication token")
-
-@app.middleware("http")
-async def add_trace_headers(request: Request, call_next):
-    """Add tracing context to all requests"""
-    start_time = time.time()
-    
-    # Get current span and add request info
-    current_span = trace.get_current_span()
-    if current_span:
-        current_span.set_attribute("http.method", request.method)
-        current_span.set_attribute("http.url", str(request.url))
-        current_span.set_attribute("http.user_agent", request.headers.get("user-agent", ""))
-        current_span.set_attribute("client.ip", await get_client_ip(request))
-    
-    response = await call_next(request)
     
-    # Add response info
-    processing_time = time.time() - start_time
-    if current_span:
-        current_span.set_attribute("http.status_code", response.status_code)
-        current_span.set_attribute("http.response_time_ms", processing_time * 1000)
-    
-    response.headers["X-Response-Time"] = str(processing_time)
-    return response
+    auth_cache[token_hash] = user
+    return user
+
+class TraceHeadersMiddleware:
+    """Add tracing context and response timing to all requests (pure ASGI)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_ns = time.perf_counter_ns()
+
+        # Get current span and add request info (skipped when sampled out)
+        current_span = trace.get_current_span()
+        recording = current_span.is_recording()
+        set_attribute = current_span.set_attribute
+        if recording:
+            user_agent = ""
+            for key, value in scope["headers"]:
+                if key == b"user-agent":
+                    user_agent = value.decode("latin-1")
+                    break
+            set_attribute("http.method", scope["method"])
+            set_attribute("http.url", str(URL(scope=scope)))
+            set_attribute("http.user_agent", user_agent)
+            set_attribute("client.ip", get_client_ip(Request(scope)))
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # Add response info; copy headers so cached responses are never mutated
+                elapsed_ns = time.perf_counter_ns() - start_ns
+                if recording:
+                    set_attribute("http.status_code", message["status"])
+                    set_attribute("http.response_time_ms", elapsed_ns // 1_000_000)
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"x-response-time", f"{elapsed_ns / 1e9:.6f}".encode()),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+# Registered after FastAPIInstrumentor so the server span is already current
+app.add_middleware(TraceHeadersMiddleware)
+
+# Last healthy /health response, reused briefly to absorb probe bursts
+HEALTH_CACHE_SECONDS = 1.0
+health_cache: Dict[str, Any] = {"expires_at": 0.0, "response": None}
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
+    if time.monotonic() < health_cache["expires_at"]:
+        return health_cache["response"]
+    
     with tracer.start_as_current_span("health_check"):
         # Check downstream services
         service_health = {}
         
-        for service_name, service_url in SERVICES.items():
-            try:
-                response = await http_client.get(f"{service_url}/health", timeout=5.0)
+        responses = await asyncio.gather(
+            *(http_client.get(health_url, timeout=5.0) for _, health_url in HEALTH_CHECKS),
+            return_exceptions=True
+        )
+        
+        for (service_name, _), response in zip(HEALTH_CHECKS, responses):
+            if isinstance(response, Exception):
                 service_health[service_name] = {
-                    "status": "healthy" if response.status_code == 200 else "unhealthy",
-                    "response_time_ms": response.elapsed.total_seconds() * 1000
+                    "status": "unhealthy",
+                    "error": str(response)
                 }
-            except Exception as e:
+            else:
                 service_health[service_name] = {
-                    "status": "unhealthy",
-                    "error": str(e)
+                    "status": "healthy" if response.status_code == 200 else "unhealthy",
+                    "response_time_ms": response.elapsed.total_seconds() * 1000
                 }
         
         overall_status = "healthy" if all(
             service["status"] == "healthy" for service in service_health.values()
         ) else "degraded"
         
-        return {
+        response = ORJSONResponse({
             "status": overall_status,
             "service": "api-gateway",
             "downstream_services": service_health
-        }
+        })
+        if overall_status == "healthy":
+            health_cache["response"] = response
+            health_cache["expires_at"] = time.monotonic() + HEALTH_CACHE_SECONDS
+        return response
 
-@app.post("/api/v1/ask")
+@app.post("/api/v1/ask", response_class=ORJSONResponse)
 async def ask_question(
     request: QuestionRequest,
     req: Request,
     user: Dict[str, Any] = Depends(authenticate)
 ):
     """Ask a question via the LLM service"""
-    with tracer.start_as_current_span("gateway.ask_question") as span:
-        # Set user context
-        span.set_attribute("user.id", user["user_id"])
-        span.set_attribute("user.role", user["role"])
-        span.set_attribute("question.text", request.question)
+    with tracer.start_as_current_span("gateway.ask_question", attributes={
+        "user.id": user["user_id"],
+        "user.role": user["role"],
+        "question.text": request.question
+    }) as span:
+        recording = span.is_recording()
         
         # Rate limiting
-        client_ip = await get_client_ip(req)
+        client_ip = get_client_ip(req)
         if not await check_rate_limit(client_ip):
             span.set_status(trace.Status(trace.StatusCode.ERROR, "Rate limit exceeded"))
             raise HTTPException(status_code=429, detail="Rate limit exceeded")
         
         try:
             # Forward request to LLM service
-            with tracer.start_as_current_span("forward_to_llm_service") as forward_span:
+            with tracer.start_as_current_span("forward_to_llm_service", attributes={
+                "downstream.service": "llm-service"
+            }) as forward_span:
                 response = await http_client.post(
-                    f"{SERVICES['llm-service']}/ask",
-                    json=request.dict(),
-                    headers={"X-User-ID": user["user_id"]}
+                    URLS.llm_ask,
+                    content=orjson.dumps(request.model_dump()),
+                    headers={"X-User-ID": user["user_id"], "Content-Type": "application/json"}
                 )
                 
-                forward_span.set_attribute("downstream.service", "llm-service")
-                forward_span.set_attribute("downstream.status_code", response.status_code)
-                forward_span.set_attribute("downstream.response_time_ms", 
-                                         response.elapsed.total_seconds() * 1000)
+                if forward_span.is_recording():
+                    forward_span.set_attributes({
+                        "downstream.status_code": response.status_code,
+                        "downstream.response_time_ms": response.elapsed.total_seconds() * 1000
+                    })
                 
+                body = await response.aread()
                 if response.status_code != 200:
                     forward_span.set_status(trace.Status(trace.StatusCode.ERROR, 
                                                        f"HTTP {response.status_code}"))
                     raise HTTPException(status_code=response.status_code, 
-                                      detail=response.text)
+                                      detail=body.decode("utf-8", "replace"))
                 
-                result = response.json()
+                result = orjson.loads(body)
                 
                 # Add gateway metadata
                 result["gateway_info"] = {
@@ -219,11 +331,13 @@ async def ask_question(
                     "request_timestamp": time.time()
                 }
                 
-                span.set_attribute("response.confidence", result.get("confidence", 0))
-                span.set_attribute("response.processing_time_ms", 
-                                 result.get("processing_time_ms", 0))
+                if recording:
+                    span.set_attributes({
+                        "response.confidence": result.get("confidence", 0),
+                        "response.processing_time_ms": result.get("processing_time_ms", 0)
+                    })
                 
-                return result
+                return ORJSONResponse(result)
                 
         except httpx.RequestError as e:
             span.record_exception(e)
@@ -241,32 +355,38 @@ async def get_gateway_stats(user: Dict[str, Any] = Depends(authenticate)):
         span.set_attribute("user.id", user["user_id"])
         
         # Calculate basic stats
-        total_requests = sum(
-            sum(counts.values()) for counts in request_counts.values()
-        )
-        
-        active_clients = len(request_counts)
+        window = int(time.time()) // 60
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.get(TOTAL_REQUESTS_KEY)
+                pipe.pfcount(f"rl:clients:{window}")
+                total_requests, active_clients = await pipe.execute()
+            total_requests = int(total_requests or 0)
+        except RedisError:
+            total_requests = active_clients = 0
         
         # Get downstream service stats
         service_stats = {}
-        for service_name, service_url in SERVICES.items():
-            try:
-                if service_name == "llm-service":
-                    response = await http_client.get(f"{service_url}/metrics")
-                    if response.status_code == 200:
-                        service_stats[service_name] = response.json()
-                elif service_name == "vector-store":
-                    response = await http_client.get(f"{service_url}/stats")
-                    if response.status_code == 200:
-                        service_stats[service_name] = response.json()
-            except Exception:
+        responses = await asyncio.gather(
+            http_client.get(URLS.llm_metrics),
+            http_client.get(URLS.vector_stats),
+            return_exceptions=True
+        )
+        
+        for service_name, response in zip(("llm-service", "vector-store"), responses):
+            if isinstance(response, Exception):
                 service_stats[service_name] = {"status": "unavailable"}
+            elif response.status_code == 200:
+                try:
+                    service_stats[service_name] = orjson.loads(await response.aread())
+                except orjson.JSONDecodeError:
+                    service_stats[service_name] = {"status": "unavailable"}
         
         return {
             "gateway": {
                 "total_requests": total_requests,
                 "active_clients": active_clients,
-                "rate_limits_active": bool(request_counts)
+                "rate_limits_active": active_clients > 0
             },
             "services": service_stats
         }
@@ -290,4 +410,12 @@ async def get_trace(trace_id: str, user: Dict[str, Any] = Depends(authenticate))
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8080,
+        loop="uvloop",
+        http="httptools",
+        access_log=False,
+        workers=os.cpu_count()
+    )
\ No newline at end of file
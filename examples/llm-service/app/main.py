@@ -9,15 +9,19 @@ A real-world example demonstrating automatic tracing of:
 
 import os
 import time
+import hashlib
 import httpx
 import asyncio
+import orjson
+import tiktoken
 from typing import List, Dict, Any
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from opentelemetry import trace
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
 from opentelemetry.sdk.resources import Resource
@@ -34,22 +38,39 @@ tracer_provider = trace.get_tracer_provider()
 
 # Configure OTLP exporter to send to Phoenix
 otlp_exporter = OTLPSpanExporter(
-    endpoint=os.getenv("PHOENIX_ENDPOINT", "http://phoenix:6006/v1/traces")
+    endpoint=os.getenv("PHOENIX_ENDPOINT", "phoenix:4317"),
+    insecure=True
 )
 
-span_processor = BatchSpanProcessor(otlp_exporter)
+# Larger, less frequent batches amortize export cost across many spans
+span_processor = BatchSpanProcessor(
+    otlp_exporter,
+    max_queue_size=8192,
+    max_export_batch_size=1024,
+    schedule_delay_millis=2000,
+    export_timeout_millis=15000
+)
 tracer_provider.add_span_processor(span_processor)
 
 # Get tracer
 tracer = trace.get_tracer(__name__)
 
 # Initialize FastAPI app
-app = FastAPI(title="LLM Q&A Service", version="1.0.0")
+app = FastAPI(title="LLM Q&A Service", version="1.0.0", default_response_class=ORJSONResponse)
 
 # Auto-instrument FastAPI and HTTP clients
 FastAPIInstrumentor.instrument_app(app)
 HTTPXClientInstrumentor().instrument()
 
+# Tokenizer for llm.usage.* counts, loaded once at import
+TOKENIZER = tiktoken.get_encoding("cl100k_base")
+
+# Translation table for the mock answer (drops question marks)
+DROP_QUESTION_MARKS = str.maketrans("", "", "?")
+
+# Largest serialized prompt recorded verbatim on LLM spans
+MAX_INLINE_MESSAGES_BYTES = 4096
+
 # Pydantic models
 class QuestionRequest(BaseModel):
     question: str
@@ -71,18 +92,27 @@ class ChatRequest(BaseModel):
     model: str = "gpt-3.5-turbo"
     temperature: float = 0.7
 
+# Shared HTTP client (connection pool) for all outbound calls
+SHARED_HTTP = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=256, max_keepalive_connections=128, keepalive_expiry=60),
+    timeout=httpx.Timeout(30.0, connect=5.0)
+)
+
 # Vector store client
 class VectorStoreClient:
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, client: httpx.AsyncClient = SHARED_HTTP):
         self.base_url = base_url
-        self.client = httpx.AsyncClient()
+        self.client = client
     
     async def search_similar(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
         """Search for similar documents in vector store"""
         with tracer.start_as_current_span("vector_store.search") as span:
-            span.set_attribute("vector_store.query", query)
-            span.set_attribute("vector_store.limit", limit)
-            span.set_attribute("vector_store.index", "knowledge_base")
+            recording = span.is_recording()
+            if recording:
+                span.set_attribute("vector_store.query", query)
+                span.set_attribute("vector_store.limit", limit)
+                span.set_attribute("vector_store.index", "knowledge_base")
             
             try:
                 # Simulate vector search with some processing time
@@ -98,8 +128,9 @@ class VectorStoreClient:
                     for i in range(min(limit, 3))
                 ]
                 
-                span.set_attribute("vector_store.results_count", len(mock_results))
-                span.set_attribute("vector_store.top_score", mock_results[0]["score"] if mock_results else 0)
+                if recording:
+                    span.set_attribute("vector_store.results_count", len(mock_results))
+                    span.set_attribute("vector_store.top_score", mock_results[0]["score"] if mock_results else 0)
                 
                 return mock_results
                 
@@ -110,50 +141,58 @@ class VectorStoreClient:
 
 # LLM client with tracing
 class LLMClient:
-    def __init__(self):
-        self.client = httpx.AsyncClient()
+    def __init__(self, client: httpx.AsyncClient = SHARED_HTTP):
+        self.client = client
         self.model = "gpt-3.5-turbo"
     
-    async def generate_answer(self, question: str, context: List[str], temperature: float = 0.7) -> str:
-        """Generate answer using LLM with context"""
-        with tracer.start_as_current_span("llm.completion") as span:
-            # Set LLM-specific attributes
-            span.set_attribute("llm.vendor", "openai")
-            span.set_attribute("llm.request.model", self.model)
-            span.set_attribute("llm.request.temperature", temperature)
-            span.set_attribute("llm.request.max_tokens", 500)
-            
-            # Build prompt
-            context_text = "\n".join(context)
-            prompt = f"""Context:\n{context_text}\n\nQuestion: {question}\n\nAnswer:"""
-            
+    async def generate_answer(self, question: str, prompt: str, temperature: float = 0.7) -> str:
+        """Generate answer using LLM with a prompt already built from context"""
+        with tracer.start_as_current_span("llm.completion", attributes={
+            "llm.vendor": "openai",
+            "llm.request.model": self.model,
+            "llm.request.temperature": temperature,
+            "llm.request.max_tokens": 500
+        }) as span:
             messages = [
                 {"role": "system", "content": "You are a helpful assistant that answers questions based on the provided context."},
                 {"role": "user", "content": prompt}
             ]
             
-            span.set_attribute("llm.request.messages", str(messages))
+            # Record a hash and size for grouping; only inline small payloads
+            recording = span.is_recording()
+            if recording:
+                messages_blob = orjson.dumps(messages)
+                message_attributes = {
+                    "llm.request.messages_hash": hashlib.blake2b(messages_blob, digest_size=8).hexdigest(),
+                    "llm.request.messages_bytes": len(messages_blob)
+                }
+                if len(messages_blob) < MAX_INLINE_MESSAGES_BYTES:
+                    message_attributes["llm.request.messages"] = messages_blob.decode()
+                span.set_attributes(message_attributes)
             
             try:
                 # Simulate LLM API call with realistic timing
-                start_time = time.time()
+                start_ns = time.perf_counter_ns()
                 await asyncio.sleep(0.5 + (len(prompt) * 0.001))  # Realistic latency
                 
                 # Mock LLM response (in real app, this would call OpenAI API)
-                answer = f"Based on the provided context, {question.lower().replace('?', '')} can be explained as follows: This is a comprehensive answer that draws from the relevant documents and provides accurate information."
+                answer = f"Based on the provided context, {question.lower().translate(DROP_QUESTION_MARKS)} can be explained as follows: This is a comprehensive answer that draws from the relevant documents and provides accurate information."
                 
                 # Set response attributes
-                processing_time = time.time() - start_time
-                prompt_tokens = len(prompt.split())
-                completion_tokens = len(answer.split())
-                total_tokens = prompt_tokens + completion_tokens
-                
-                span.set_attribute("llm.response.model", self.model)
-                span.set_attribute("llm.usage.prompt_tokens", prompt_tokens)
-                span.set_attribute("llm.usage.completion_tokens", completion_tokens)
-                span.set_attribute("llm.usage.total_tokens", total_tokens)
-                span.set_attribute("llm.response.finish_reason", "stop")
-                span.set_attribute("llm.processing_time_ms", processing_time * 1000)
+                if recording:
+                    elapsed_ms = (time.perf_counter_ns() - start_ns) // 1_000_000
+                    prompt_tokens = len(TOKENIZER.encode_ordinary(prompt))
+                    completion_tokens = len(TOKENIZER.encode_ordinary(answer))
+                    total_tokens = prompt_tokens + completion_tokens
+                    
+                    span.set_attributes({
+                        "llm.response.model": self.model,
+                        "llm.usage.prompt_tokens": prompt_tokens,
+                        "llm.usage.completion_tokens": completion_tokens,
+                        "llm.usage.total_tokens": total_tokens,
+                        "llm.response.finish_reason": "stop",
+                        "llm.processing_time_ms": elapsed_ms
+                    })
                 
                 return answer
                 
@@ -166,21 +205,32 @@ class LLMClient:
 vector_store = VectorStoreClient(os.getenv("VECTOR_STORE_URL", "http://vector-store:8001"))
 llm_client = LLMClient()
 
+@app.on_event("shutdown")
+async def close_http_client():
+    """Close the shared HTTP client"""
+    await SHARED_HTTP.aclose()
+
+# Health payload never changes, so it is serialized once
+HEALTH_RESPONSE = Response(
+    content=orjson.dumps({"status": "healthy", "service": "llm-qa-service"}),
+    media_type="application/json"
+)
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "llm-qa-service"}
+    return HEALTH_RESPONSE
 
 @app.post("/ask", response_model=Answer)
 async def ask_question(request: QuestionRequest):
     """Ask a question and get an AI-powered answer with context"""
-    with tracer.start_as_current_span("ask_question") as span:
-        start_time = time.time()
-        
-        # Set request attributes
-        span.set_attribute("question.text", request.question)
-        span.set_attribute("question.context_limit", request.context_limit)
-        span.set_attribute("question.temperature", request.temperature)
+    with tracer.start_as_current_span("ask_question", attributes={
+        "question.text": request.question,
+        "question.context_limit": request.context_limit,
+        "question.temperature": request.temperature
+    }) as span:
+        start_ns = time.perf_counter_ns()
+        recording = span.is_recording()
         
         try:
             # Step 1: Search for relevant context
@@ -191,11 +241,17 @@ async def ask_question(request: QuestionRequest):
                 )
                 context = [doc["content"] for doc in similar_docs]
                 sources = [doc["metadata"]["source"] for doc in similar_docs]
+                
+                # Build prompt once, right where the context is retrieved
+                prompt = "".join([
+                    "Context:\n", "\n".join(context),
+                    "\n\nQuestion: ", request.question, "\n\nAnswer:"
+                ])
             
             # Step 2: Generate answer using LLM
             answer_text = await llm_client.generate_answer(
                 request.question, 
-                context, 
+                prompt, 
                 request.temperature
             )
             
@@ -203,15 +259,21 @@ async def ask_question(request: QuestionRequest):
             with tracer.start_as_current_span("calculate_confidence"):
                 avg_score = sum(doc["score"] for doc in similar_docs) / len(similar_docs) if similar_docs else 0
                 confidence = min(avg_score * 1.2, 1.0)  # Boost confidence slightly
-                span.set_attribute("confidence.average_score", avg_score)
-                span.set_attribute("confidence.final", confidence)
+                if recording:
+                    span.set_attributes({
+                        "confidence.average_score": avg_score,
+                        "confidence.final": confidence
+                    })
             
-            processing_time = int((time.time() - start_time) * 1000)
+            processing_time = (time.perf_counter_ns() - start_ns) // 1_000_000
             
             # Set response attributes
-            span.set_attribute("response.processing_time_ms", processing_time)
-            span.set_attribute("response.confidence", confidence)
-            span.set_attribute("response.sources_count", len(sources))
+            if recording:
+                span.set_attributes({
+                    "response.processing_time_ms": processing_time,
+                    "response.confidence": confidence,
+                    "response.sources_count": len(sources)
+                })
             
             return Answer(
                 answer=answer_text,
@@ -228,11 +290,12 @@ async def ask_question(request: QuestionRequest):
 @app.post("/chat")
 async def chat_completion(request: ChatRequest):
     """Chat completion endpoint (simulates OpenAI-compatible API)"""
-    with tracer.start_as_current_span("chat_completion") as span:
-        span.set_attribute("llm.vendor", "openai")
-        span.set_attribute("llm.request.model", request.model)
-        span.set_attribute("llm.request.temperature", request.temperature)
-        span.set_attribute("llm.request.messages_count", len(request.messages))
+    with tracer.start_as_current_span("chat_completion", attributes={
+        "llm.vendor": "openai",
+        "llm.request.model": request.model,
+        "llm.request.temperature": request.temperature,
+        "llm.request.messages_count": len(request.messages)
+    }) as span:
         
         try:
             # Simulate processing time
@@ -245,12 +308,15 @@ async def chat_completion(request: ChatRequest):
             response_content = f"I understand your message: '{last_message[:50]}...' Here's my response based on that."
             
             # Set usage metrics
-            prompt_tokens = sum(len(msg.content.split()) for msg in request.messages)
-            completion_tokens = len(response_content.split())
+            prompt_tokens = sum(len(TOKENIZER.encode_ordinary(msg.content)) for msg in request.messages)
+            completion_tokens = len(TOKENIZER.encode_ordinary(response_content))
             
-            span.set_attribute("llm.usage.prompt_tokens", prompt_tokens)
-            span.set_attribute("llm.usage.completion_tokens", completion_tokens)
-            span.set_attribute("llm.usage.total_tokens", prompt_tokens + completion_tokens)
+            if span.is_recording():
+                span.set_attributes({
+                    "llm.usage.prompt_tokens": prompt_tokens,
+                    "llm.usage.completion_tokens": completion_tokens,
+                    "llm.usage.total_tokens": prompt_tokens + completion_tokens
+                })
             
             return {
                 "id": "chatcmpl-123",
@@ -291,4 +357,12 @@ async def get_metrics():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        access_log=False,
+        workers=os.cpu_count()
+    )
\ No newline at end of file
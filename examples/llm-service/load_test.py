@@ -4,11 +4,18 @@ Generates realistic traffic to demonstrate Phoenix observability
 """
 
 import asyncio
-import httpx
+import aiohttp
+import os
 import random
+import sys
 import time
 from typing import List
 
+try:
+    import uvloop
+except ImportError:  # uvloop is not available on Windows
+    uvloop = None
+
 # Sample questions for realistic testing
 SAMPLE_QUESTIONS = [
     "What is artificial intelligence and how does it work?",
@@ -36,13 +43,22 @@ USER_SCENARIOS = [
     {"auth": "Bearer user-bob", "questions_per_session": 4, "delay_range": (1, 4)},
 ]
 
-async def simulate_user_session(client: httpx.AsyncClient, scenario: dict, session_id: int):
+# Maximum number of user sessions in flight at once
+CONCURRENCY_LIMIT = int(os.getenv("CONCURRENCY_LIMIT", "128"))
+
+# Request constants, built once instead of per session/request
+ASK_URL = "http://api-gateway:8080/api/v1/ask"
+for scenario in USER_SCENARIOS:
+    scenario["headers"] = {"Authorization": scenario["auth"]} if scenario["auth"] else {}
+
+async def simulate_user_session(client: aiohttp.ClientSession, scenario: dict, session_id: int):
     """Simulate a user session with multiple questions"""
-    print(f"[Session {session_id}] Starting user session...")
+    # Buffer this session's output and write it once at the end instead of contending on stdout
+    log = [f"[Session {session_id}] Starting user session..."]
     
-    headers = {}
-    if scenario["auth"]:
-        headers["Authorization"] = scenario["auth"]
+    headers = scenario["headers"]
+    rng = random.Random(session_id)
+    request_data = {}
     
     questions_asked = 0
     successful_requests = 0
@@ -50,84 +66,98 @@ async def simulate_user_session(client: httpx.AsyncClient, scenario: dict, sessi
     for i in range(scenario["questions_per_session"]):
         try:
             # Select a random question
-            question = random.choice(SAMPLE_QUESTIONS)
+            question = rng.choice(SAMPLE_QUESTIONS)
             
             # Add some variation to request parameters
-            request_data = {
-                "question": question,
-                "context_limit": random.randint(3, 7),
-                "temperature": round(random.uniform(0.3, 0.9), 1)
-            }
+            request_data["question"] = question
+            request_data["context_limit"] = rng.randint(3, 7)
+            request_data["temperature"] = round(rng.uniform(0.3, 0.9), 1)
             
-            print(f"[Session {session_id}] Asking: {question[:50]}...")
+            log.append(f"[Session {session_id}] Asking: {question[:50]}...")
             
             # Make the request
-            start_time = time.time()
-            response = await client.post(
-                "http://api-gateway:8080/api/v1/ask",
+            start_ns = time.perf_counter_ns()
+            async with client.post(
+                ASK_URL,
                 json=request_data,
-                headers=headers,
-                timeout=30.0
-            )
-            response_time = time.time() - start_time
+                headers=headers
+            ) as response:
+                status = response.status
+                if status == 200:
+                    result = await response.json()
+                else:
+                    error_text = await response.text()
+            elapsed_ms = (time.perf_counter_ns() - start_ns) // 1_000_000
             
             questions_asked += 1
             
-            if response.status_code == 200:
+            if status == 200:
                 successful_requests += 1
-                result = response.json()
                 confidence = result.get("confidence", 0)
                 processing_time = result.get("processing_time_ms", 0)
                 
-                print(f"[Session {session_id}] ✅ Response received (confidence: {confidence:.2f}, "
-                      f"processing: {processing_time}ms, total: {response_time*1000:.0f}ms)")
+                log.append(f"[Session {session_id}] ✅ Response received (confidence: {confidence:.2f}, "
+                           f"processing: {processing_time}ms, total: {elapsed_ms}ms)")
             else:
-                print(f"[Session {session_id}] ❌ Error: {response.status_code} - {response.text}")
+                log.append(f"[Session {session_id}] ❌ Error: {status} - {error_text}")
             
             # Wait before next question
             if i < scenario["questions_per_session"] - 1:
-                delay = random.uniform(*scenario["delay_range"])
+                delay = rng.uniform(*scenario["delay_range"])
                 await asyncio.sleep(delay)
                 
         except Exception as e:
-            print(f"[Session {session_id}] ❌ Exception: {str(e)}")
+            log.append(f"[Session {session_id}] ❌ Exception: {str(e)}")
     
-    print(f"[Session {session_id}] Session complete: {successful_requests}/{questions_asked} successful")
+    log.append(f"[Session {session_id}] Session complete: {successful_requests}/{questions_asked} successful")
+    sys.stdout.write("\n".join(log) + "\n")
     return {"session_id": session_id, "successful": successful_requests, "total": questions_asked}
 
-async def generate_error_scenarios(client: httpx.AsyncClient):
+async def generate_error_scenarios(client: aiohttp.ClientSession):
     """Generate some error scenarios for testing"""
     print("\n🔥 Generating error scenarios...")
     
     # Rate limiting test
     print("Testing rate limiting...")
-    for i in range(5):
-        try:
-            response = await client.post(
-                "http://api-gateway:8080/api/v1/ask",
-                json={"question": f"Rate limit test {i}"},
-                timeout=5.0
-            )
-            if response.status_code == 429:
-                print("✅ Rate limiting triggered")
-                break
-        except Exception:
-            pass
-        await asyncio.sleep(0.1)
+    statuses = await asyncio.gather(
+        *(post_status(client, ASK_URL, {"question": f"Rate limit test {i}"}) for i in range(5)),
+        return_exceptions=True
+    )
+    ok = statuses.count(200)
+    limited = statuses.count(429)
+    print(f"Burst results: {ok} succeeded, {limited} rate limited")
+    if limited:
+        print("✅ Rate limiting triggered")
     
     # Invalid request test
     print("Testing invalid requests...")
     try:
-        response = await client.post(
-            "http://api-gateway:8080/api/v1/ask",
-            json={"invalid": "request"},
-            timeout=5.0
-        )
-        print(f"Invalid request response: {response.status_code}")
+        async with client.post(
+            ASK_URL,
+            json={"invalid": "request"}
+        ) as response:
+            print(f"Invalid request response: {response.status}")
     except Exception as e:
         print(f"Invalid request error: {e}")
 
-async def check_services_health(client: httpx.AsyncClient):
+async def probe_status(client: aiohttp.ClientSession, url: str) -> int:
+    """Return the HTTP status of a GET request"""
+    async with client.get(url) as response:
+        return response.status
+
+async def post_status(client: aiohttp.ClientSession, url: str, payload: dict) -> int:
+    """Return the HTTP status of a JSON POST request"""
+    async with client.post(url, json=payload) as response:
+        return response.status
+
+async def warm_up_connections(client: aiohttp.ClientSession, count: int):
+    """Open keep-alive connections to the gateway before the load phase"""
+    await asyncio.gather(
+        *(probe_status(client, "http://api-gateway:8080/health") for _ in range(count)),
+        return_exceptions=True
+    )
+
+async def check_services_health(client: aiohttp.ClientSession):
     """Check health of all services"""
     services = {
         "Phoenix": "http://phoenix:6006/",
@@ -137,25 +167,28 @@ async def check_services_health(client: httpx.AsyncClient):
     }
     
     print("🏥 Checking service health...")
-    for service_name, url in services.items():
-        try:
-            response = await client.get(url, timeout=10.0)
-            status = "✅ Healthy" if response.status_code == 200 else f"❌ Status {response.status_code}"
-            print(f"  {service_name}: {status}")
-        except Exception as e:
-            print(f"  {service_name}: ❌ Error - {str(e)}")
+    results = await asyncio.gather(
+        *(probe_status(client, url) for url in services.values()),
+        return_exceptions=True
+    )
+    for service_name, result in zip(services.keys(), results):
+        if isinstance(result, Exception):
+            print(f"  {service_name}: ❌ Error - {str(result)}")
+            continue
+        status = "✅ Healthy" if result == 200 else f"❌ Status {result}"
+        print(f"  {service_name}: {status}")
 
-async def get_statistics(client: httpx.AsyncClient):
+async def get_statistics(client: aiohttp.ClientSession):
     """Get system statistics"""
     print("\n📊 Getting system statistics...")
     try:
-        response = await client.get("http://api-gateway:8080/api/v1/stats", timeout=10.0)
-        if response.status_code == 200:
-            stats = response.json()
-            print(f"Gateway stats: {stats.get('gateway', {})}")
-            print(f"Service stats available: {list(stats.get('services', {}).keys())}")
-        else:
-            print(f"Failed to get stats: {response.status_code}")
+        async with client.get("http://api-gateway:8080/api/v1/stats") as response:
+            if response.status == 200:
+                stats = await response.json()
+                print(f"Gateway stats: {stats.get('gateway', {})}")
+                print(f"Service stats available: {list(stats.get('services', {}).keys())}")
+            else:
+                print(f"Failed to get stats: {response.status}")
     except Exception as e:
         print(f"Error getting stats: {e}")
 
@@ -168,18 +201,30 @@ async def main():
     print("⏳ Waiting for services to be ready...")
     await asyncio.sleep(10)
     
-    async with httpx.AsyncClient() as client:
+    async with aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=200, limit_per_host=100, keepalive_timeout=60),
+        timeout=aiohttp.ClientTimeout(total=30)
+    ) as client:
         # Check service health
         await check_services_health(client)
         await asyncio.sleep(2)
         
+        # Warm up one gateway connection per session so the first requests skip the handshake
+        await warm_up_connections(client, len(USER_SCENARIOS))
+        
         # Generate normal user traffic
         print(f"\n👥 Simulating {len(USER_SCENARIOS)} concurrent user sessions...")
         
-        # Create concurrent user sessions
+        # Create concurrent user sessions, bounded so large scenario lists don't flood the loop
+        semaphore = asyncio.Semaphore(CONCURRENCY_LIMIT)
+        
+        async def _bounded(scenario: dict, session_id: int):
+            async with semaphore:
+                return await simulate_user_session(client, scenario, session_id)
+        
         tasks = []
         for i, scenario in enumerate(USER_SCENARIOS):
-            task = simulate_user_session(client, scenario, i + 1)
+            task = _bounded(scenario, i + 1)
             tasks.append(task)
         
         # Run sessions concurrently
@@ -212,4 +257,7 @@ async def main():
         print("📊 API Gateway health: http://localhost:8080/health")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
\ No newline at end of file
@@ -10,9 +10,14 @@ import json
 import time
 from typing import Dict, Any
 
+try:
+    import uvloop
+except ImportError:  # uvloop is not available on Windows
+    uvloop = None
+
 API_BASE = "http://localhost:8080/api/v1"
 
-async def test_health_checks():
+async def test_health_checks(client: httpx.AsyncClient):
     """Test health endpoints of all services"""
     print("🏥 Testing Health Endpoints")
     print("=" * 40)
@@ -24,26 +29,29 @@ async def test_health_checks():
         "Vector Store": "http://localhost:8001/health"
     }
     
-    async with httpx.AsyncClient() as client:
-        for service, url in endpoints.items():
-            try:
-                response = await client.get(url, timeout=10.0)
-                status = "✅ Healthy" if response.status_code == 200 else f"❌ Status {response.status_code}"
-                print(f"{service:15}: {status}")
-                
-                if response.status_code == 200 and service == "API Gateway":
-                    health_data = response.json()
-                    downstream = health_data.get("downstream_services", {})
-                    for ds_service, ds_health in downstream.items():
-                        ds_status = ds_health.get("status", "unknown")
-                        print(f"  └─ {ds_service}: {ds_status}")
-                        
-            except Exception as e:
-                print(f"{service:15}: ❌ Error - {str(e)}")
+    responses = await asyncio.gather(
+        *(client.get(url, timeout=10.0) for url in endpoints.values()),
+        return_exceptions=True
+    )
     
+    for service, response in zip(endpoints.keys(), responses):
+        if isinstance(response, Exception):
+            print(f"{service:15}: ❌ Error - {str(response)}")
+            continue
+        
+        status = "✅ Healthy" if response.status_code == 200 else f"❌ Status {response.status_code}"
+        print(f"{service:15}: {status}")
+        
+        if response.status_code == 200 and service == "API Gateway":
+            health_data = response.json()
+            downstream = health_data.get("downstream_services", {})
+            for ds_service, ds_health in downstream.items():
+                ds_status = ds_health.get("status", "unknown")
+                print(f"  └─ {ds_service}: {ds_status}")
+
     print()
 
-async def test_question_answering():
+async def test_question_answering(client: httpx.AsyncClient):
     """Test the Q&A functionality"""
     print("❓ Testing Question Answering")
     print("=" * 40)
@@ -66,41 +74,40 @@ async def test_question_answering():
         }
     ]
     
-    async with httpx.AsyncClient() as client:
-        for i, question_data in enumerate(questions, 1):
-            print(f"\n📝 Question {i}: {question_data['question']}")
+    for i, question_data in enumerate(questions, 1):
+        print(f"\n📝 Question {i}: {question_data['question']}")
+        
+        try:
+            start_ns = time.perf_counter_ns()
+            response = await client.post(
+                f"{API_BASE}/ask",
+                json=question_data,
+                headers={"Authorization": "Bearer demo-token"},
+                timeout=30.0
+            )
+            elapsed_ms = (time.perf_counter_ns() - start_ns) // 1_000_000
             
-            try:
-                start_time = time.time()
-                response = await client.post(
-                    f"{API_BASE}/ask",
-                    json=question_data,
-                    headers={"Authorization": "Bearer demo-token"},
-                    timeout=30.0
-                )
-                response_time = time.time() - start_time
+            if response.status_code == 200:
+                result = response.json()
+                print(f"✅ Success (took {elapsed_ms}ms)")
+                print(f"   Answer: {result['answer'][:100]}...")
+                print(f"   Confidence: {result['confidence']:.2f}")
+                print(f"   Sources: {len(result['sources'])} documents")
+                print(f"   Processing: {result['processing_time_ms']}ms")
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    print(f"✅ Success (took {response_time:.2f}s)")
-                    print(f"   Answer: {result['answer'][:100]}...")
-                    print(f"   Confidence: {result['confidence']:.2f}")
-                    print(f"   Sources: {len(result['sources'])} documents")
-                    print(f"   Processing: {result['processing_time_ms']}ms")
-                    
-                    if 'gateway_info' in result:
-                        gateway_info = result['gateway_info']
-                        print(f"   User: {gateway_info.get('user_id', 'unknown')}")
-                else:
-                    print(f"❌ Error: {response.status_code} - {response.text}")
-                    
-            except Exception as e:
-                print(f"❌ Exception: {str(e)}")
-            
-            # Small delay between requests
-            await asyncio.sleep(1)
+                if 'gateway_info' in result:
+                    gateway_info = result['gateway_info']
+                    print(f"   User: {gateway_info.get('user_id', 'unknown')}")
+            else:
+                print(f"❌ Error: {response.status_code} - {response.text}")
+                
+        except Exception as e:
+            print(f"❌ Exception: {str(e)}")
+        
+        # Small delay between requests
+        await asyncio.sleep(1)
 
-async def test_vector_search():
+async def test_vector_search(client: httpx.AsyncClient):
     """Test vector search directly"""
     print("\n🔍 Testing Vector Search")
     print("=" * 40)
@@ -111,33 +118,32 @@ async def test_vector_search():
         {"query": "container technology", "limit": 4}
     ]
     
-    async with httpx.AsyncClient() as client:
-        for query_data in search_queries:
-            print(f"\n🔎 Searching: {query_data['query']}")
+    for query_data in search_queries:
+        print(f"\n🔎 Searching: {query_data['query']}")
+        
+        try:
+            response = await client.post(
+                "http://localhost:8001/search",
+                json=query_data,
+                timeout=10.0
+            )
             
-            try:
-                response = await client.post(
-                    "http://localhost:8001/search",
-                    json=query_data,
-                    timeout=10.0
-                )
+            if response.status_code == 200:
+                results = response.json()
+                print(f"✅ Found {len(results)} results")
                 
-                if response.status_code == 200:
-                    results = response.json()
-                    print(f"✅ Found {len(results)} results")
-                    
-                    for i, result in enumerate(results, 1):
-                        score = result['score']
-                        content = result['content'][:80]
-                        source = result['metadata']['source']
-                        print(f"   {i}. {content}... (score: {score:.3f}, source: {source})")
-                else:
-                    print(f"❌ Error: {response.status_code} - {response.text}")
-                    
-            except Exception as e:
-                print(f"❌ Exception: {str(e)}")
+                for i, result in enumerate(results, 1):
+                    score = result['score']
+                    content = result['content'][:80]
+                    source = result['metadata']['source']
+                    print(f"   {i}. {content}... (score: {score:.3f}, source: {source})")
+            else:
+                print(f"❌ Error: {response.status_code} - {response.text}")
+                
+        except Exception as e:
+            print(f"❌ Exception: {str(e)}")
 
-async def test_authentication():
+async def test_authentication(client: httpx.AsyncClient):
     """Test different authentication scenarios"""
     print("\n🔐 Testing Authentication")
     print("=" * 40)
@@ -154,94 +160,94 @@ async def test_authentication():
         "context_limit": 3
     }
     
-    async with httpx.AsyncClient() as client:
-        for auth_test in auth_tests:
-            print(f"\n🔑 Testing: {auth_test['name']}")
+    for auth_test in auth_tests:
+        print(f"\n🔑 Testing: {auth_test['name']}")
+        
+        try:
+            response = await client.post(
+                f"{API_BASE}/ask",
+                json=test_question,
+                headers=auth_test["headers"],
+                timeout=10.0
+            )
             
-            try:
-                response = await client.post(
-                    f"{API_BASE}/ask",
-                    json=test_question,
-                    headers=auth_test["headers"],
-                    timeout=10.0
-                )
+            if response.status_code == 200:
+                result = response.json()
+                user_id = result.get('gateway_info', {}).get('user_id', 'unknown')
+                print(f"✅ Success - User: {user_id}")
+            elif response.status_code == 401:
+                print("❌ Unauthorized (expected for invalid token)")
+            else:
+                print(f"❌ Status: {response.status_code}")
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    user_id = result.get('gateway_info', {}).get('user_id', 'unknown')
-                    print(f"✅ Success - User: {user_id}")
-                elif response.status_code == 401:
-                    print("❌ Unauthorized (expected for invalid token)")
-                else:
-                    print(f"❌ Status: {response.status_code}")
-                    
-            except Exception as e:
-                print(f"❌ Exception: {str(e)}")
+        except Exception as e:
+            print(f"❌ Exception: {str(e)}")
 
-async def test_rate_limiting():
+async def test_rate_limiting(client: httpx.AsyncClient):
     """Test rate limiting"""
     print("\n⏱️  Testing Rate Limiting")
     print("=" * 40)
     
-    async with httpx.AsyncClient() as client:
-        print("Sending multiple rapid requests...")
-        
-        for i in range(10):
-            try:
-                response = await client.post(
-                    f"{API_BASE}/ask",
-                    json={"question": f"Rate limit test {i}"},
-                    timeout=5.0
-                )
-                
-                if response.status_code == 200:
-                    print(f"Request {i+1}: ✅ Success")
-                elif response.status_code == 429:
-                    print(f"Request {i+1}: ⏱️  Rate limited (expected)")
-                    break
-                else:
-                    print(f"Request {i+1}: ❌ Status {response.status_code}")
-                    
-            except Exception as e:
-                print(f"Request {i+1}: ❌ Exception: {str(e)}")
-            
-            await asyncio.sleep(0.1)  # Rapid requests
+    print("Sending a burst of concurrent requests...")
+    
+    responses = await asyncio.gather(
+        *(
+            client.post(f"{API_BASE}/ask", json={"question": f"Rate limit test {i}"}, timeout=5.0)
+            for i in range(10)
+        ),
+        return_exceptions=True
+    )
+    
+    succeeded = 0
+    rate_limited = 0
+    for i, response in enumerate(responses, 1):
+        if isinstance(response, Exception):
+            print(f"Request {i}: ❌ Exception: {str(response)}")
+        elif response.status_code == 200:
+            succeeded += 1
+            print(f"Request {i}: ✅ Success")
+        elif response.status_code == 429:
+            rate_limited += 1
+            print(f"Request {i}: ⏱️  Rate limited (expected)")
+        else:
+            print(f"Request {i}: ❌ Status {response.status_code}")
+    
+    print(f"Summary: {succeeded} succeeded, {rate_limited} rate limited")
 
-async def get_system_stats():
+async def get_system_stats(client: httpx.AsyncClient):
     """Get system statistics"""
     print("\n📊 System Statistics")
     print("=" * 40)
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"{API_BASE}/stats",
-                headers={"Authorization": "Bearer demo-token"},
-                timeout=10.0
-            )
+    try:
+        response = await client.get(
+            f"{API_BASE}/stats",
+            headers={"Authorization": "Bearer demo-token"},
+            timeout=10.0
+        )
+        
+        if response.status_code == 200:
+            stats = response.json()
             
-            if response.status_code == 200:
-                stats = response.json()
-                
-                print("Gateway Stats:")
-                gateway_stats = stats.get('gateway', {})
-                for key, value in gateway_stats.items():
-                    print(f"  {key}: {value}")
-                
-                print("\nService Stats:")
-                service_stats = stats.get('services', {})
-                for service, service_data in service_stats.items():
-                    print(f"  {service}:")
-                    if isinstance(service_data, dict):
-                        for key, value in service_data.items():
-                            print(f"    {key}: {value}")
-                    else:
-                        print(f"    {service_data}")
-            else:
-                print(f"❌ Error: {response.status_code} - {response.text}")
-                
-        except Exception as e:
-            print(f"❌ Exception: {str(e)}")
+            print("Gateway Stats:")
+            gateway_stats = stats.get('gateway', {})
+            for key, value in gateway_stats.items():
+                print(f"  {key}: {value}")
+            
+            print("\nService Stats:")
+            service_stats = stats.get('services', {})
+            for service, service_data in service_stats.items():
+                print(f"  {service}:")
+                if isinstance(service_data, dict):
+                    for key, value in service_data.items():
+                        print(f"    {key}: {value}")
+                else:
+                    print(f"    {service_data}")
+        else:
+            print(f"❌ Error: {response.status_code} - {response.text}")
+            
+    except Exception as e:
+        print(f"❌ Exception: {str(e)}")
 
 def print_phoenix_info():
     """Print Phoenix access information"""
@@ -267,13 +273,19 @@ async def main():
     print("⏳ Waiting for services to start...")
     await asyncio.sleep(5)
     
-    # Run tests
-    await test_health_checks()
-    await test_question_answering()
-    await test_vector_search()
-    await test_authentication()
-    await test_rate_limiting()
-    await get_system_stats()
+    # One pooled client for every test, so connections are reused between sections
+    async with httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        timeout=30.0
+    ) as client:
+        # Run tests
+        await test_health_checks(client)
+        await test_question_answering(client)
+        await test_vector_search(client)
+        await test_authentication(client)
+        await test_rate_limiting(client)
+        await get_system_stats(client)
     
     print_phoenix_info()
     
@@ -281,4 +293,7 @@ async def main():
     print("Check Phoenix UI for detailed traces: http://localhost:6006")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
\ No newline at end of file
@@ -1,8 +1,19 @@
+import os
+import sys
 import time
 import random
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+import grpc
+import orjson
 from opentelemetry import trace
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter as GRPCSpanExporter
+from opentelemetry.exporter.otlp.proto.http import Compression
+from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter as HTTPSpanExporter
 from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.trace import Status, StatusCode
@@ -13,97 +24,190 @@ resource = Resource.create({
     "service.version": "1.0.0"
 })
 
-# Set up the tracer provider
-trace.set_tracer_provider(TracerProvider(resource=resource))
-tracer_provider = trace.get_tracer_provider()
+# OTLP transport: gRPC by default, set OTEL_EXPORTER_OTLP_PROTOCOL=http/protobuf to use HTTP
+OTLP_PROTOCOL = os.getenv("OTEL_EXPORTER_OTLP_PROTOCOL", "grpc")
 
-# Configure OTLP exporter to send to Phoenix
-otlp_exporter = OTLPSpanExporter(
-    endpoint="http://localhost:6006/v1/traces",
-    headers={}
-)
+def _init_tracing():
+    """Install the tracer provider and exporter once, reusing an existing provider on re-import"""
+    provider = trace.get_tracer_provider()
+    if isinstance(provider, TracerProvider):
+        return provider
+    
+    # Sample root traces by ratio (e.g. 0.1 for load runs); child spans such as vector.search
+    # follow their parent's decision so sampled traces stay complete
+    sampler = ParentBased(root=TraceIdRatioBased(float(os.getenv("TRACE_SAMPLE_RATIO", "1.0"))))
+    # shutdown_on_exit registers provider.shutdown with atexit, draining the batch queue on exit
+    provider = TracerProvider(resource=resource, sampler=sampler, shutdown_on_exit=True)
+    
+    # A short export timeout lets the batch processor give up quickly when Phoenix is down
+    if OTLP_PROTOCOL == "grpc":
+        # Configure OTLP exporter to send to Phoenix's gRPC listener, gzip-compressed
+        otlp_exporter = GRPCSpanExporter(
+            endpoint="localhost:4317",
+            insecure=True,
+            compression=grpc.Compression.Gzip,
+            timeout=2
+        )
+    else:
+        # Pooled keep-alive session so exports reuse connections instead of reconnecting per flush
+        export_session = requests.Session()
+        export_session.mount("http://", HTTPAdapter(pool_connections=8, pool_maxsize=32))
+        export_session.headers.update({"Connection": "keep-alive"})
+        
+        # Configure OTLP exporter to send to Phoenix, gzip-compressed
+        otlp_exporter = HTTPSpanExporter(
+            endpoint="http://localhost:6006/v1/traces",
+            headers={},
+            compression=Compression.Gzip,
+            session=export_session,
+            timeout=2
+        )
+    
+    # Add the exporter to the tracer provider; a deep queue avoids drops under the concurrent
+    # generator and large batches compress better and mean one export per ~1024 spans
+    span_processor = BatchSpanProcessor(
+        otlp_exporter,
+        max_queue_size=8192,
+        max_export_batch_size=1024,
+        schedule_delay_millis=2000,
+        export_timeout_millis=20000
+    )
+    provider.add_span_processor(span_processor)
+    
+    trace.set_tracer_provider(provider)
+    return provider
 
-# Add the exporter to the tracer provider
-span_processor = BatchSpanProcessor(otlp_exporter)
-tracer_provider.add_span_processor(span_processor)
+# Set up the tracer provider
+tracer_provider = _init_tracing()
 
 # Get a tracer
 tracer = trace.get_tracer("test-tracer")
 
+# Constant attribute payloads, serialized to compact JSON once at import
+_MESSAGES_STR = orjson.dumps([
+    {"role": "system", "content": "You are a helpful assistant."},
+    {"role": "user", "content": "What is the capital of France?"}
+]).decode()
+_CHOICES_STR = orjson.dumps([
+    {"message": {"role": "assistant", "content": "The capital of France is Paris."}}
+]).decode()
+_DOCS_STR = orjson.dumps([
+    {"content": "Paris is the capital of France", "score": 0.95},
+    {"content": "France is a country in Europe", "score": 0.75}
+]).decode()
+
+# Attribute values repeated across spans, interned once
+_OPENAI = sys.intern("openai")
+_GPT35 = sys.intern("gpt-3.5-turbo")
+_GPT4 = sys.intern("gpt-4")
+_PINECONE = sys.intern("pinecone")
+_KNOWLEDGE_BASE = sys.intern("knowledge-base")
+_ADA_002 = sys.intern("text-embedding-ada-002")
+
+# Simulated processing time; set SIMULATE_LATENCY=0 to measure raw exporter throughput
+_SIM = os.environ.get("SIMULATE_LATENCY", "1") == "1"
+
+# Pre-drawn sleep durations, cycled instead of calling random.uniform per span
+_SLEEP_SAMPLES = 1024
+_CHAT_SLEEPS = itertools.cycle([random.uniform(0.5, 2.0) for _ in range(_SLEEP_SAMPLES)])
+_SEARCH_SLEEPS = itertools.cycle([random.uniform(0.1, 0.5) for _ in range(_SLEEP_SAMPLES)])
+_EMBED_SLEEPS = itertools.cycle([random.uniform(0.1, 0.3) for _ in range(_SLEEP_SAMPLES)])
+
+# Status set on every successful simulated request
+_OK_STATUS = Status(StatusCode.OK)
+
+# Error status and exception event reused by every simulated rate-limit failure
+_RATE_LIMIT_STATUS = Status(StatusCode.ERROR, "Rate limit exceeded")
+_RATE_LIMIT_EVENT = {
+    "exception.type": "RateLimitError",
+    "exception.message": "Rate limit exceeded"
+}
+
 def simulate_llm_calls():
     """Simulate LLM application traces"""
+    _sleep = time.sleep
     
-    # Simulate a chat completion
-    with tracer.start_as_current_span("chat.completion") as span:
-        span.set_attribute("llm.vendor", "openai")
-        span.set_attribute("llm.request.model", "gpt-3.5-turbo")
-        span.set_attribute("llm.request.messages", str([
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": "What is the capital of France?"}
-        ]))
+    # One span per request; the chat, retrieval and embedding steps are recorded as events
+    with tracer.start_as_current_span("llm.request", attributes={
+        "llm.vendor": _OPENAI,
+        "llm.request.model": _GPT35
+    }) as root:
+        # Simulate a chat completion
+        if _SIM:
+            _sleep(next(_CHAT_SLEEPS))
+        root.add_event("chat.completion", attributes={
+            "llm.request.messages": _MESSAGES_STR,
+            "llm.response.model_suffix": "-0613",
+            "llm.usage.total_tokens": 150,
+            "llm.usage.prompt_tokens": 50,
+            "llm.usage.completion_tokens": 100,
+            "llm.response.choices": _CHOICES_STR
+        })
         
-        # Simulate processing time
-        time.sleep(random.uniform(0.5, 2.0))
-        
-        # Set response attributes
-        span.set_attribute("llm.response.model", "gpt-3.5-turbo-0613")
-        span.set_attribute("llm.usage.total_tokens", 150)
-        span.set_attribute("llm.usage.prompt_tokens", 50)
-        span.set_attribute("llm.usage.completion_tokens", 100)
-        span.set_attribute("llm.response.choices", str([
-            {"message": {"role": "assistant", "content": "The capital of France is Paris."}}
-        ]))
+        # Simulate vector search, kept as a real child span
+        with tracer.start_as_current_span("vector.search", attributes={
+            "vector.database": _PINECONE,
+            "vector.index": _KNOWLEDGE_BASE
+        }) as search_span:
+            if _SIM:
+                _sleep(next(_SEARCH_SLEEPS))
+            search_span.set_attribute("vector.results.count", 5)
         
-    # Simulate a retrieval operation
-    with tracer.start_as_current_span("retrieval.query") as span:
-        span.set_attribute("retrieval.query", "capital of France")
-        span.set_attribute("retrieval.k", 5)
+        # Simulate a retrieval operation
+        root.add_event("retrieval.query", attributes={
+            "retrieval.query": "capital of France",
+            "retrieval.k": 5,
+            "retrieval.documents": _DOCS_STR
+        })
         
-        # Simulate vector search
-        with tracer.start_as_current_span("vector.search") as search_span:
-            search_span.set_attribute("vector.database", "pinecone")
-            search_span.set_attribute("vector.index", "knowledge-base")
-            time.sleep(random.uniform(0.1, 0.5))
-            search_span.set_attribute("vector.results.count", 5)
+        # Simulate an embedding operation
+        if _SIM:
+            _sleep(next(_EMBED_SLEEPS))
+        root.add_event("embedding.create", attributes={
+            "embedding.model": _ADA_002,
+            "embedding.input": "What is the capital of France?",
+            "embedding.dimension": 1536,
+            "embedding.tokens": 8
+        })
         
-        span.set_attribute("retrieval.documents", str([
-            {"content": "Paris is the capital of France", "score": 0.95},
-            {"content": "France is a country in Europe", "score": 0.75}
-        ]))
-    
-    # Simulate an embedding operation
-    with tracer.start_as_current_span("embedding.create") as span:
-        span.set_attribute("embedding.model", "text-embedding-ada-002")
-        span.set_attribute("embedding.input", "What is the capital of France?")
-        time.sleep(random.uniform(0.1, 0.3))
-        span.set_attribute("embedding.dimension", 1536)
-        span.set_attribute("embedding.tokens", 8)
+        root.set_status(_OK_STATUS)
 
 def simulate_error_trace():
     """Simulate an error trace"""
-    with tracer.start_as_current_span("chat.completion.error") as span:
-        span.set_attribute("llm.vendor", "openai")
-        span.set_attribute("llm.request.model", "gpt-4")
-        span.set_attribute("error", True)
-        span.set_status(Status(StatusCode.ERROR, "Rate limit exceeded"))
-        span.record_exception(Exception("Rate limit exceeded"))
+    with tracer.start_as_current_span("chat.completion.error", attributes={
+        "llm.vendor": _OPENAI,
+        "llm.request.model": _GPT4,
+        "error": True
+    }) as span:
+        span.set_status(_RATE_LIMIT_STATUS)
+        span.add_event("exception", attributes=_RATE_LIMIT_EVENT)
 
-if __name__ == "__main__":
-    print("Sending telemetry data to Phoenix...")
+def simulate_llm_calls_bulk(n=5):
+    """Emit n simulated LLM traces plus an error trace so they ship in a single flush"""
+    print(f"Sending {n} trace batches")
     
-    # Send multiple traces
-    for i in range(5):
-        print(f"Sending trace batch {i+1}/5")
-        simulate_llm_calls()
-        
+    if not _SIM:
+        # Nothing to overlap without simulated latency; open every span in one tight sequence
+        for _ in range(n):
+            simulate_llm_calls()
+        simulate_error_trace()
+        return
+    
+    # Overlap the simulated latency; each worker thread keeps its own span context
+    with ThreadPoolExecutor(max_workers=n + 1) as executor:
         # Occasionally simulate an error
-        if i == 2:
-            simulate_error_trace()
-        
-        time.sleep(1)
+        error_trace = executor.submit(simulate_error_trace)
+        list(executor.map(lambda _: simulate_llm_calls(), range(n)))
+        error_trace.result()
+
+if __name__ == "__main__":
+    print("Sending telemetry data to Phoenix...")
     
-    # Force flush to ensure all spans are sent
-    tracer_provider.force_flush()
+    try:
+        simulate_llm_calls_bulk(5)
+    finally:
+        # Force flush to ensure all spans are sent, even if a batch failed
+        tracer_provider.force_flush(10_000)
     
     print("Telemetry data sent successfully!")
     print("Check Phoenix UI at http://localhost:6006")
\ No newline at end of file